@@ -1,24 +1,28 @@
 """This module has functionality to send error screenshots via smtp."""
 
 import smtplib
+import threading
 from email.message import EmailMessage
 import base64
 import traceback
 from io import BytesIO
 
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
 from PIL import ImageGrab
 
 from robot_framework import config
 
 
-def send_error_screenshot(to_address: str | list[str], exception: Exception, process_name: str):
+def send_error_screenshot(to_address: str | list[str], exception: Exception, process_name: str, orchestrator_connection: OrchestratorConnection):
     """Sends an email with an error report, including a screenshot, when an exception occurs.
+    The screenshot is taken immediately, while the email is sent on a background thread so the caller isn't blocked by SMTP.
     Configuration details such as SMTP server, port, sender email, etc., should be set in 'config' module.
 
     Args:
         to_address: Email address or list of addresses to send the error report.
         exception: The exception that triggered the error.
         process_name: Name of the process from OpenOrchestrator.
+        orchestrator_connection: A connection to OpenOrchestrator, used to log if the email couldn't be sent.
     """
     # Create message
     msg = EmailMessage()
@@ -38,7 +42,7 @@ def send_error_screenshot(to_address: str | list[str], exception: Exception, pro
         <body>
             <p>Error type: {type(exception).__name__}</p>
             <p>Error message: {exception}</p>
-            <p>{traceback.format_exc()}</p>
+            <p>{"".join(traceback.format_exception(exception))}</p>
             <img src="data:image/png;base64,{screenshot_base64}" alt="Screenshot">
         </body>
     </html>
@@ -47,7 +51,25 @@ def send_error_screenshot(to_address: str | list[str], exception: Exception, pro
     msg.set_content("Please enable HTML to view this message.")
     msg.add_alternative(html_message, subtype='html')
 
-    # Send message
-    with smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT) as smtp:
-        smtp.starttls()
-        smtp.send_message(msg)
+    # Send message. The thread is not a daemon, so the email is still sent if the robot exits right after.
+    threading.Thread(target=_send_message, args=(msg, orchestrator_connection), name="error_screenshot").start()
+
+
+def _send_message(msg: EmailMessage, orchestrator_connection: OrchestratorConnection):
+    """Sends the email message using the SMTP server from the 'config' module.
+    Runs on a background thread, so any exception is logged to OpenOrchestrator instead of being raised.
+
+    Args:
+        msg: The email message to send.
+        orchestrator_connection: A connection to OpenOrchestrator.
+    """
+    try:
+        with smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT) as smtp:
+            smtp.starttls()
+            smtp.send_message(msg)
+
+    # pylint: disable-next = broad-exception-caught
+    except Exception as e:
+        print(f"Failed to send error screenshot: {e}")
+
+        orchestrator_connection.log_error(f"Failed to send error screenshot to {msg['to']}: {e}")
@@ -2,7 +2,9 @@
 
 import json
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
+import orjson
 from OpenOrchestrator.database.queues import QueueElement, QueueStatus
 from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
 
@@ -10,6 +12,13 @@ from robot_framework import config
 from robot_framework import error_screenshot
 from robot_framework import servicenow_handler
 
+# Single background worker for ServiceNow calls so error handling doesn't wait on the HTTP round-trip.
+# The executor's worker is joined at interpreter exit, so pending incidents are still sent before shutdown.
+_SERVICENOW_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="servicenow")
+
+# The error email constant is static for the lifetime of the process, so it is only fetched from OpenOrchestrator once
+_ERROR_EMAIL: str | None = None
+
 
 class BusinessError(Exception):
     """An empty exception used to identify errors caused by breaking business rules"""
@@ -33,33 +42,73 @@ def handle_error(message: str, error_count: str | None, error: Exception, queue_
         "message": str(error),
         "trace": traceback.format_exc()
     }
-    error_msg = json.dumps(error_dict, ensure_ascii=False)
-    error_msg = (
-        f"{error_msg[:500]}  [...] {error_msg[-490:]}"
-        if len(error_msg) > 1000
-        else error_msg
-    )  # Shorten error msg such that it can be sent to SQL database
-    error_email = orchestrator_connection.get_constant(config.ERROR_EMAIL).value
+    # Shorten the large fields before encoding, so long traces aren't JSON-encoded only to be cut away.
+    # The full error_dict is kept for ServiceNow.
+    log_dict = {
+        **error_dict,
+        "message": _shorten(error_dict["message"], 200),
+        "trace": _shorten(error_dict["trace"], 500)
+    }
+    try:
+        error_msg = orjson.dumps(log_dict).decode("utf-8")
+    except orjson.JSONEncodeError:
+        # orjson rejects strings with lone surrogates, e.g. from undecodable paths, which json can still encode
+        error_msg = json.dumps(log_dict, ensure_ascii=False)
+    error_msg = _shorten(error_msg, 1000)  # Escaping can still grow the msg, so make sure it can be sent to SQL database
 
     orchestrator_connection.log_error(error_msg)
     if queue_element:
         orchestrator_connection.set_queue_element_status(queue_element.id, QueueStatus.FAILED, error_msg)
-    if error != BusinessError:
-        error_screenshot.send_error_screenshot(error_email, error, orchestrator_connection.process_name)
+    if not isinstance(error, BusinessError):
+        error_screenshot.send_error_screenshot(_get_error_email(orchestrator_connection), error, orchestrator_connection.process_name, orchestrator_connection)
 
     if message == "ApplicationException" and error_count == config.MAX_RETRY_COUNT:
-        try:
-            orchestrator_connection.log_trace("ApplicationException caught. Handling ServiceNow incident.")
+        orchestrator_connection.log_trace("ApplicationException caught. Queuing ServiceNow incident.")
+
+        # Sending failures are logged by servicenow_handler, including error_msg
+        _SERVICENOW_EXECUTOR.submit(servicenow_handler.handle_incident, orchestrator_connection, error_dict, error_msg)
+
+
+def drain_servicenow() -> None:
+    """Wait for any queued ServiceNow incident to be handled and send the buffered errors right away.
+    Should be called once, when the robot is done handling errors, as no more incidents can be queued afterwards.
+    """
+    _SERVICENOW_EXECUTOR.shutdown(wait=True)
+    servicenow_handler.flush_pending_incidents()
+
+
+def _get_error_email(orchestrator_connection: OrchestratorConnection) -> str:
+    """Get the error email constant from OpenOrchestrator, fetching it only on the first call.
 
-            servicenow_handler.handle_incident(orchestrator_connection, error_dict)
+    Args:
+        orchestrator_connection: A connection to OpenOrchestrator.
+
+    Returns:
+        The error email address.
+    """
+    global _ERROR_EMAIL  # pylint: disable=global-statement
+    if _ERROR_EMAIL is None:
+        _ERROR_EMAIL = orchestrator_connection.get_constant(config.ERROR_EMAIL).value
+    return _ERROR_EMAIL
 
-            orchestrator_connection.log_trace("ServiceNow incident handled.")
 
-        # pylint: disable-next = broad-exception-caught
-        except Exception as e:
-            print(f"Failed to create ServiceNow incident: {e}")
+def _shorten(text: str, max_length: int) -> str:
+    """Shorten a text to at most max_length characters by cutting out the middle.
 
-            orchestrator_connection.log_error(f"Failed to create ServiceNow incident. error_msg: {error_msg}")
+    Args:
+        text: The text to shorten.
+        max_length: The maximum length of the returned text.
+
+    Returns:
+        The text itself if short enough, otherwise its start and end joined by '[...]'.
+    """
+    if len(text) <= max_length:
+        return text
+    if max_length <= 7:
+        return text[:max_length]  # No room for the ' [...] ' marker
+    head = (max_length - 7) // 2
+    tail = max_length - 7 - head
+    return f"{text[:head]} [...] {text[len(text) - tail:]}"
 
 
 def log_exception(orchestrator_connection: OrchestratorConnection) -> callable:
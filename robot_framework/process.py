@@ -3,6 +3,8 @@
 import subprocess
 import time
 import pyautogui
+import pygetwindow
+import pyperclip
 
 from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
 from OpenOrchestrator.database.queues import QueueElement
@@ -14,7 +16,43 @@ def process(orchestrator_connection: OrchestratorConnection, queue_element: Queu
     print("HEY!!!!!")
     orchestrator_connection.log_trace("Running process.")
 
+    # Remember already open Notepad windows, e.g. from an earlier retry, so only the new one is used
+    existing_windows = _get_windows("Notepad")
     subprocess.Popen(["notepad.exe"])
-    time.sleep(3)
-    
-    pyautogui.write("Hello World", interval=0.2)
+    _wait_for_new_active_window("Notepad", existing_windows, timeout=3)
+
+    # Paste the text in one go instead of typing it character by character
+    pyperclip.copy("Hello World")
+    pyautogui.hotkey("ctrl", "v")
+
+
+def _get_windows(title: str) -> list:
+    """Get all windows whose title ends with the given title, e.g. 'Untitled - Notepad' but not 'new 1 - Notepad++'."""
+    return [win for win in pygetwindow.getWindowsWithTitle(title) if win.title.endswith(title)]
+
+
+def _wait_for_new_active_window(title: str, existing_windows: list, timeout: float, poll_interval: float = 0.05) -> None:
+    """Wait until a window with the given title, which isn't in existing_windows, is open and has focus.
+
+    Args:
+        title: The end of the window title to look for.
+        existing_windows: The matching windows that were open before the program was started.
+        timeout: The maximum number of seconds to wait.
+        poll_interval: The number of seconds between each check.
+
+    Raises:
+        TimeoutError: If no new window has focus before the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        new_windows = [win for win in _get_windows(title) if win not in existing_windows]
+        if new_windows:
+            window = new_windows[0]
+            if window.isActive:
+                return
+            try:
+                window.activate()
+            except pygetwindow.PyGetWindowException:
+                pass  # The window may not be ready for focus yet, so try again on the next poll
+        time.sleep(poll_interval)
+    raise TimeoutError(f"No new '{title}' window got focus within {timeout} seconds.")
@@ -10,7 +10,7 @@ from OpenOrchestrator.database.queues import QueueStatus
 
 from robot_framework import initialize
 from robot_framework import reset
-from robot_framework.exceptions import handle_error, BusinessError, log_exception
+from robot_framework.exceptions import handle_error, BusinessError, log_exception, drain_servicenow
 from robot_framework import process
 from robot_framework import config
 from robot_framework import finalize
@@ -60,6 +60,9 @@ def main():
     reset.close_all(orchestrator_connection)
     reset.kill_all(orchestrator_connection)
 
+    # Send any ServiceNow incident before the robot can fail below
+    drain_servicenow()
+
     if config.FAIL_ROBOT_ON_TOO_MANY_ERRORS and error_count == config.MAX_RETRY_COUNT:
         raise RuntimeError("Process failed too many times.")
 
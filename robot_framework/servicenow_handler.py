@@ -1,6 +1,14 @@
 """ServiceNow Incident handler - this script creates a new incident in ServiceNow or adds a comment to an existing one"""
 
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from robot_framework import config
 
@@ -8,100 +16,227 @@ from robot_framework import config
 PROD_INSTANCE = "aarhuskommune"
 TEST_INSTANCE = "aarhuskommunedev"
 
+# _SN_BASE = f"https://{PROD_INSTANCE}.service-now.com/api/now/table/incident"
+_SN_BASE = f"https://{TEST_INSTANCE}.service-now.com/api/now/table/incident"
+
+# (connect, read) timeout in seconds for all ServiceNow calls, so a hung endpoint can't block the robot indefinitely
+_SN_TIMEOUT = (3.05, 10)
+
+# A shared session lets consecutive calls (e.g. GET followed by PUT) reuse the same connection to ServiceNow
+# Only the GET search is retried, as a retried PUT/POST could add the same comment or incident twice
+# raise_on_status=False returns the last response when retries run out, so the status code handling below still applies
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods={"GET"},
+        raise_on_status=False
+    )
+))
+_SESSION.headers.update({
+    "Content-Type": "application/json",
+    "Accept": "application/json"
+})
+
+# Errors are buffered and sent to ServiceNow as one combined update, either when the buffer is full or when the wait window has passed
+_BATCH_MAX_SIZE = 10
+_BATCH_MAX_WAIT = 2.0  # seconds
+_PENDING_INCIDENTS = deque()  # (orchestrator_connection, error_dict, error_msg, timestamp)
+_PENDING_LOCK = threading.Lock()
+_FLUSH_LOCK = threading.Lock()
+_FLUSH_TIMER = None
+
+# Short-lived caches keyed on process name, so a burst of errors doesn't search ServiceNow for an incident on every flush
+_INCIDENT_CACHE_TTL = 30.0  # seconds
+_NO_INCIDENT_CACHE: dict[str, float] = {}  # process name -> time the search found no open incident
+_INCIDENT_SYS_ID_CACHE: dict[str, tuple[str, float]] = {}  # process name -> (sys_id, time the incident was found or created)
+
+
+def handle_incident(orchestrator_connection, error_dict, error_msg):
+    """
+    This function buffers an incoming error - the buffer is sent to ServiceNow when it is full, or when the wait window has passed
+    The shortened error_msg is logged to OpenOrchestrator if the error couldn't be sent
+    """
+
+    global _FLUSH_TIMER  # pylint: disable=global-statement
+
+    with _PENDING_LOCK:
+        _PENDING_INCIDENTS.append((orchestrator_connection, error_dict, error_msg, datetime.now()))
+
+        flush_now = len(_PENDING_INCIDENTS) >= _BATCH_MAX_SIZE
+
+        if not flush_now and _FLUSH_TIMER is None:
+            _FLUSH_TIMER = threading.Timer(_BATCH_MAX_WAIT, flush_pending_incidents)
+            _FLUSH_TIMER.start()
+
+    if flush_now:
+        flush_pending_incidents()
+
+
+def flush_pending_incidents():
+    """
+    Sends all buffered errors to ServiceNow - a new incident is created, or the existing one is updated with a single comment
+    """
+
+    global _FLUSH_TIMER  # pylint: disable=global-statement
+
+    # Only one flush talks to ServiceNow at a time, so a second flush sees the incident the first one created
+    with _FLUSH_LOCK:
+        with _PENDING_LOCK:
+            if _FLUSH_TIMER is not None:
+                _FLUSH_TIMER.cancel()
+                _FLUSH_TIMER = None
+
+            entries = list(_PENDING_INCIDENTS)
+            _PENDING_INCIDENTS.clear()
+
+        if not entries:
+            return
 
-def handle_incident(orchestrator_connection, error_dict):
+        orchestrator_connection = entries[-1][0]
+        error_entries = [(error_dict, timestamp) for _, error_dict, _, timestamp in entries]
+
+        try:
+            # The credential is fetched once and shared by all ServiceNow calls for this flush
+            service_now_api_credential = orchestrator_connection.get_credential(config.SERVICE_NOW_API_PROD_USER)
+            auth = (service_now_api_credential.username, service_now_api_credential.password)
+
+            process_name = orchestrator_connection.process_name
+
+            # We start by looking for an existing ServiceNow incident with a matching process name
+            existing_incident_sys_id = _find_incident_sys_id(orchestrator_connection, auth)
+
+            if existing_incident_sys_id:
+                if update_incident(orchestrator_connection, auth, error_entries, existing_incident_sys_id) is None:
+                    _INCIDENT_SYS_ID_CACHE.pop(process_name, None)
+
+            else:
+                new_incident = post_incident(orchestrator_connection, auth, error_entries)
+
+                if new_incident:
+                    _NO_INCIDENT_CACHE.pop(process_name, None)
+                    _INCIDENT_SYS_ID_CACHE[process_name] = (new_incident.get("sys_id"), time.monotonic())
+
+        # This may run on the timer thread, so errors are logged instead of raised
+        # pylint: disable-next = broad-exception-caught
+        except Exception as e:
+            print(f"Failed to handle ServiceNow incident: {e}")
+
+            # Log each lost error, so it is still visible which errors never reached ServiceNow
+            for _, _, error_msg, _ in entries:
+                orchestrator_connection.log_error(f"Failed to handle ServiceNow incident: {e}. error_msg: {error_msg}")
+
+
+def _find_incident_sys_id(orchestrator_connection, auth):
     """
-    This function handles an incoming error and determines if a new incident should be created, or an existing one should be updated
+    Returns the sys_id of the open incident for the process, or None - a recent result is reused instead of searching ServiceNow again
     """
 
-    # We start by looking for an existing ServiceNow incident with a matching process name
-    existing_incident_sys_id = get_incident(orchestrator_connection)
+    process_name = orchestrator_connection.process_name
+    now = time.monotonic()
+
+    cached_sys_id, cached_at = _INCIDENT_SYS_ID_CACHE.get(process_name, (None, 0.0))
+
+    if cached_sys_id and now - cached_at < _INCIDENT_CACHE_TTL:
+        return cached_sys_id
+
+    if now - _NO_INCIDENT_CACHE.get(process_name, float("-inf")) < _INCIDENT_CACHE_TTL:
+        return None
+
+    existing_incident_sys_id = get_incident(orchestrator_connection, auth)
 
     if existing_incident_sys_id:
-        update_incident(orchestrator_connection, error_dict, existing_incident_sys_id)
+        _INCIDENT_SYS_ID_CACHE[process_name] = (existing_incident_sys_id, now)
 
     else:
-        post_incident(orchestrator_connection, error_dict)
+        _NO_INCIDENT_CACHE[process_name] = now
 
+    return existing_incident_sys_id
 
-def get_incident(orchestrator_connection):
+
+def _format_error_entries(error_entries, message_label, trace_label):
     """
-    Retrieves an existing incident that matches certain criteria from the error_dict.
+    Joins the buffered errors into one text, separating each error with ---
     """
 
-    process_name = orchestrator_connection.process_name
+    blocks = []
 
-    # Here we specify the incidents we would like returned - short description must include the process name, state can not be 6 as that means the incident is resolved
-    # We order by latest created incident, so we always update the newest returned - in theory the request should only return 1 incident
-    query = f"short_descriptionLIKE{process_name}^active=true^state!=6^ORDERBYDESCsys_created_on"
+    for error_dict, timestamp in error_entries:
+        error_message = error_dict.get("message", "")  # The actual Exception message in str format
+        error_trace = error_dict.get("trace", "")  # The traceback.format_exc() in str format
 
-    # get_url = f"https://{PROD_INSTANCE}.service-now.com/api/now/table/incident?sysparm_limit=50&sysparm_query={query}"
-    get_url = f"https://{TEST_INSTANCE}.service-now.com/api/now/table/incident?sysparm_limit=50&sysparm_query={query}"
+        block = f"Caught at: {timestamp:%Y-%m-%d %H:%M:%S}\n\n"
+        block += f"{message_label}:\n{error_message}\n\n"
+        block += f"{trace_label}:\n{error_trace}"
 
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+        blocks.append(block)
 
-    service_now_api_username = orchestrator_connection.get_credential(config.SERVICE_NOW_API_PROD_USER).username
-    service_now_api_password = orchestrator_connection.get_credential(config.SERVICE_NOW_API_PROD_USER).password
+    return "\n\n---\n\n".join(blocks)
 
-    # pylint: disable=missing-timeout
-    response = requests.get(get_url, headers=headers, auth=(service_now_api_username, service_now_api_password))
 
-    # pylint: disable=no-else-return
-    if response.status_code == 200:
-        results = response.json().get("result", [])
+def get_incident(orchestrator_connection, auth):
+    """
+    Retrieves an existing incident that matches certain criteria from the error_dict.
+    Returns None if no open incident exists, and raises requests.HTTPError if the search fails.
+    """
 
-        if results:
-            print(results[0].get("sys_id"))
+    process_name = orchestrator_connection.process_name
 
-            return results[0].get("sys_id")  # Only return first match
+    # Here we specify the incidents we would like returned - short description must include the process name, state can not be 6 as that means the incident is resolved
+    # We order by latest created incident and only ask for the newest one, with only its sys_id field, as that is all we use
+    # The params are url-encoded by requests, so characters like ^ and != are sent correctly
+    params = {
+        "sysparm_limit": 1,
+        "sysparm_fields": "sys_id",
+        "sysparm_query": f"short_descriptionLIKE{process_name}^active=true^state!=6^ORDERBYDESCsys_created_on"
+    }
 
-        else:
-            return None
+    response = _SESSION.get(_SN_BASE, params=params, auth=auth, timeout=_SN_TIMEOUT)
 
-    else:
+    if response.status_code != 200:
         print(f"Error {response.status_code}: {response.text}")
 
-        return None
+        # A failed search is raised instead of returning None, so it isn't mistaken for "no open incident"
+        response.raise_for_status()
+        raise requests.HTTPError(f"Unexpected status code {response.status_code} when searching for an incident", response=response)
+
+    results = orjson.loads(response.content).get("result", [])
 
+    if results:
+        print(results[0].get("sys_id"))
 
-def update_incident(orchestrator_connection, error_dict, existing_incident_sys_id):
+        return results[0].get("sys_id")  # Only return first match
+
+    return None
+
+
+def update_incident(orchestrator_connection, auth, error_entries, existing_incident_sys_id):
     """
-    Method to update an existing incident - the method adds a new comment to the existing incident
+    Method to update an existing incident - the method adds a single new comment covering all buffered errors to the existing incident
     """
 
-    error_message = error_dict.get("message", "")  # The actual Exception message in str format
-    error_trace = error_dict.get("trace", "")  # The traceback.format_exc() in str format
-
     process_name = orchestrator_connection.process_name
 
-    comment_text = f"The process '{process_name}' has encountered another ApplicationException!\n\n"
-    comment_text += f"Exception message:\n{error_message}\n\n"
-    comment_text += f"Full Exception trace:\n{error_trace}\n\n"
+    if len(error_entries) == 1:
+        comment_text = f"The process '{process_name}' has encountered another ApplicationException!\n\n"
+    else:
+        comment_text = f"The process '{process_name}' has encountered {len(error_entries)} more ApplicationExceptions!\n\n"
+
+    comment_text += _format_error_entries(error_entries, "Exception message", "Full Exception trace") + "\n\n"
     comment_text += "Please investigate the source of this error, as this comment is attached to an existing incident with the same process name."
 
     print()
     print(comment_text)
 
-    # put_url = f"https://{PROD_INSTANCE}.service-now.com/api/now/table/incident/{existing_incident_sys_id}"
-    put_url = f"https://{TEST_INSTANCE}.service-now.com/api/now/table/incident/{existing_incident_sys_id}"
-
     incident_data = {
         "comments": f'{comment_text}'
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-
-    service_now_api_username = orchestrator_connection.get_credential(config.SERVICE_NOW_API_PROD_USER).username
-    service_now_api_password = orchestrator_connection.get_credential(config.SERVICE_NOW_API_PROD_USER).password
-
-    # pylint: disable=missing-timeout
-    response = requests.put(put_url, headers=headers, auth=(service_now_api_username, service_now_api_password), json=incident_data)
+    response = _SESSION.put(f"{_SN_BASE}/{existing_incident_sys_id}", auth=auth, json=incident_data, timeout=_SN_TIMEOUT)
 
     # pylint: disable=no-else-return
     if response.status_code == 200:
@@ -113,23 +248,17 @@ def update_incident(orchestrator_connection, error_dict, existing_incident_sys_i
         return None
 
 
-def post_incident(orchestrator_connection, error_dict):
+def post_incident(orchestrator_connection, auth, error_entries):
     """
-    Create a new incident for the caught ApplicationException in ServiceNow
+    Create a new incident for the caught ApplicationException(s) in ServiceNow
     """
 
     print("inside post_incident() function ...")
 
-    error_message = error_dict.get("message", "")  # The actual Exception message in str format
-    error_trace = error_dict.get("trace", "")  # The traceback.format_exc() in str format
-
-    # post_url = f"https://{PROD_INSTANCE}.service-now.com/api/now/table/incident"
-    post_url = f"https://{TEST_INSTANCE}.service-now.com/api/now/table/incident"
-
     incident_data = {
         "contact_type": "integration",  # Should always be 'integration' - this just means the incident was created using the ServiceNow API
         "short_description": f"ApplicationException caught in process '{orchestrator_connection.process_name}'",
-        "description": f"Error message:\n{error_message}\n\nFull error trace message:\n{error_trace}",
+        "description": _format_error_entries(error_entries, "Error message", "Full error trace message"),
         "business_service": "",  # What should this be?
         "service_offering": "",  # What should this be?
         "assignment_group": "b54156a91ba5115068ba5398624bcb0e",  # MBU Proces & Udvikling Assignment Group - should this be a constant in Orchestrator?
@@ -138,23 +267,14 @@ def post_incident(orchestrator_connection, error_dict):
         "category": "Fejl",
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-
-    service_now_api_username = orchestrator_connection.get_credential(config.SERVICE_NOW_API_PROD_USER).username
-    service_now_api_password = orchestrator_connection.get_credential(config.SERVICE_NOW_API_PROD_USER).password
-
-    # pylint: disable=missing-timeout
-    response = requests.post(post_url, headers=headers, auth=(service_now_api_username, service_now_api_password), json=incident_data)
+    response = _SESSION.post(_SN_BASE, auth=auth, json=incident_data, timeout=_SN_TIMEOUT)
 
     print()
     print("Response Status Code:", response.status_code)
     print("Response Text:", response.text)
 
     # pylint: disable=no-else-return
-    if response.status_code == 200:
+    if response.status_code in (200, 201):  # ServiceNow answers 201 Created on a new record
         return response.json().get("result", {})
 
     else: